@@ -11,13 +11,20 @@
 #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 #    GNU General Public License for more details.
 
+import io
 import nrrd
 import os
+import re
+import struct
+import sys
+import zlib
 
 import multiprocessing as mp
 import numpy as np
 
-from glob import glob
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Union, Iterable, Optional, Dict, Any
 from typing_extensions import Literal
@@ -25,13 +32,59 @@ from typing_extensions import Literal
 from .. import config, utils, core
 from . import base
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # Set up logging
 logger = config.logger
 
+# File extensions recognized when reading from folders
+NRRD_EXT = ('.nrrd', '.nrrd.zst')
+
+# Map NRRD types to numpy dtypes
+_NRRD_TYPES = {}
+for _dtype, _names in {'i1': ('signed char', 'int8', 'int8_t'),
+                       'u1': ('uchar', 'unsigned char', 'uint8', 'uint8_t'),
+                       'i2': ('short', 'short int', 'signed short',
+                              'signed short int', 'int16', 'int16_t'),
+                       'u2': ('ushort', 'unsigned short', 'unsigned short int',
+                              'uint16', 'uint16_t'),
+                       'i4': ('int', 'signed int', 'int32', 'int32_t'),
+                       'u4': ('uint', 'unsigned int', 'uint32', 'uint32_t'),
+                       'i8': ('longlong', 'long long', 'long long int',
+                              'signed long long', 'signed long long int',
+                              'int64', 'int64_t'),
+                       'u8': ('ulonglong', 'unsigned long long',
+                              'unsigned long long int', 'uint64', 'uint64_t'),
+                       'f4': ('float', ),
+                       'f8': ('double', )}.items():
+    _NRRD_TYPES.update({n: _dtype for n in _names})
+
+# Header fields understood by our fast header parser
+_FAST_HEADER_FIELDS = ('type', 'dimension', 'space', 'space dimension',
+                       'sizes', 'space directions', 'space units',
+                       'space origin', 'kinds', 'endian', 'encoding')
+
+# The header ends with an empty line - pynrrd also accepts CRLF line endings
+_HEADER_END = re.compile(rb'\r?\n\r?\n')
+
+# Number of files read_nrrd checks for compression before picking threads
+# or processes for parallel imports
+_COMPRESSION_SAMPLE_SIZE = 10
+
+# Headers longer than this are left to pynrrd
+_FAST_HEADER_MAX_BYTES = 2 ** 16
+
 
 def write_nrrd(x: 'core.NeuronObject',
                filepath: Union[str, Path],
                compression_level: int = 3,
+               compression: Union[Literal['gzip'],
+                                  Literal['zstd'],
+                                  Literal['raw']] = 'gzip',
+               parallel_compress: Union[bool, int] = False,
                attrs: Optional[Dict[str, Any]] = None) -> None:
     """Write VoxelNeuron(s) to NRRD files.
 
@@ -46,9 +99,28 @@ def write_nrrd(x: 'core.NeuronObject',
                         be a folder, a "formattable" filename (see Examples) or
                         a list of filenames (one for each neuron in ``x``).
                         Existing files will be overwritten!
-    compression_level : int 1-9
+    compression_level : int 1-9 | 1-22
                         Lower = faster writing but larger files. Higher = slower
-                        writing but smaller files.
+                        writing but smaller files. Allows 1-9 for ``gzip`` and
+                        1-22 for ``zstd`` compression.
+    compression :       "gzip" | "zstd" | "raw"
+                        How to compress the data:
+
+                          - "gzip" (default) uses the NRRD's gzip encoding
+                          - "zstd" writes a raw NRRD and compresses the entire
+                            file with Zstandard; this is considerably faster
+                            than gzip but requires the ``zstandard`` library
+                            and produces ``.nrrd.zst`` files which not all
+                            NRRD readers understand (".zst" is appended to
+                            filenames ending in ".nrrd")
+                          - "raw" writes uncompressed data
+    parallel_compress : bool | int
+                        For ``compression="gzip"`` only: if True, will use
+                        multiple threads to compress the data. Integer will be
+                        interpreted as the number of threads (otherwise
+                        defaults to ``os.cpu_count()``). Only worth it for
+                        large voxel grids (>100MB). The resulting files are
+                        marginally larger but otherwise indistinguishable.
     attrs :             dict
                         Any additional attributes will be written to NRRD header.
 
@@ -101,42 +173,234 @@ def write_nrrd(x: 'core.NeuronObject',
                         Import VoxelNeuron from NRRD files.
 
     """
+    utils.eval_param(compression, name='compression',
+                     allowed_values=('gzip', 'zstd', 'raw'))
+
     compression_level = int(compression_level)
+    max_level = 22 if compression == 'zstd' else 9
 
-    if (compression_level < 1) or (compression_level > 9):
-        raise ValueError('`compression_level` must be 1-9, got '
+    if (compression_level < 1) or (compression_level > max_level):
+        raise ValueError(f'`compression_level` must be 1-{max_level}, got '
                          f'{compression_level}')
 
-    writer = base.Writer(_write_nrrd, ext='.nrrd')
+    if compression == 'zstd' and not zstandard:
+        raise ImportError('`compression="zstd"` requires the zstandard '
+                          'library:\n pip3 install zstandard')
+
+    if compression == 'zstd':
+        ext = '.nrrd.zst'
+        # Make sure explicit ".nrrd" filenames are not mistaken for folders
+        filepath = _zst_filepath(filepath)
+    else:
+        ext = '.nrrd'
+    writer = base.Writer(_write_nrrd, ext=ext)
 
     return writer.write_any(x,
                             filepath=filepath,
                             compression_level=compression_level,
+                            compression=compression,
+                            parallel_compress=parallel_compress,
                             **(attrs or {}))
 
 
+def _zst_filepath(filepath):
+    """Append ".zst" to filepath(s) ending in ".nrrd"."""
+    if isinstance(filepath, (list, tuple)):
+        return [_zst_filepath(f) for f in filepath]
+
+    if not isinstance(filepath, (str, Path)):
+        return filepath
+
+    # Filename patterns for zip files come before the "@"
+    as_str = str(filepath)
+    pattern, at, zipfile = as_str.partition('@')
+    if pattern.endswith('.nrrd'):
+        as_str = f'{pattern}.zst{at}{zipfile}'
+
+    return Path(as_str) if isinstance(filepath, Path) else as_str
+
+
 def _write_nrrd(x: 'core.VoxelNeuron',
                 filepath: Optional[str] = None,
                 compression_level: int = 1,
+                compression: str = 'gzip',
+                parallel_compress: Union[bool, int] = False,
                 **attrs) -> None:
     """Write single VoxelNeuron as NRRD file."""
     if not isinstance(x, core.VoxelNeuron):
         raise TypeError(f'Expected VoxelNeuron, got "{type(x)}"')
 
-    header = getattr(x, "nrrd_header", {})
+    header = dict(getattr(x, "nrrd_header", {}))
     header['space dimension'] = 3
     header['space directions'] = np.diag(x.units_xyz.magnitude)
     header['space units'] = [str(x.units_xyz.units)] * 3
+    header['kinds'] = ['domain'] * 3
     header.update(attrs or {})
 
-    data = x.grid
+    # pynrrd serializes the data in Fortran order which means a transposing
+    # copy for C-ordered grids. If the neuron is based on voxels, we can
+    # instead build the grid in Fortran order to begin with
+    if x._base_data_type == 'voxels' and not hasattr(x, '_grid'):
+        data = np.zeros(x.shape, dtype=x.values.dtype, order='F')
+        data[x._data[:, 0], x._data[:, 1], x._data[:, 2]] = x.values
+    else:
+        data = x.grid
+
+    # Bool and uint8 have the same size, so we can avoid a copy
     if data.dtype == bool:
-        data = data.astype('uint8')
+        data = data.view('uint8')
+
+    if compression == 'zstd':
+        # Write a raw NRRD and compress the entire file on the fly
+        header['encoding'] = 'raw'
+        cctx = zstandard.ZstdCompressor(level=compression_level, threads=-1)
+        with open(filepath, 'wb') as fh:
+            with cctx.stream_writer(fh) as zfh:
+                nrrd.write(_StreamWrapper(zfh), data=data, header=header)
+    elif compression == 'gzip' and parallel_compress:
+        # Have pynrrd write a raw NRRD and compress it ourselves
+        header['encoding'] = 'raw'
+        if isinstance(parallel_compress, bool):
+            n_threads = os.cpu_count()
+        else:
+            n_threads = int(parallel_compress)
+        with open(filepath, 'wb') as fh:
+            with _ParallelGzipWriter(fh,
+                                     compression_level=compression_level,
+                                     n_threads=n_threads) as pfh:
+                nrrd.write(pfh, data=data, header=header)
+    else:
+        header['encoding'] = compression
+        nrrd.write(str(filepath),
+                   data=data,
+                   header=header,
+                   compression_level=compression_level)
+
+
+class _StreamWrapper(io.RawIOBase):
+    """Make a writable stream (e.g. from zstandard) look like a file handle.
+
+    pynrrd only writes to proper file objects (i.e. ``io.IOBase``).
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._stream.write(b)
+        return len(b)
+
 
-    nrrd.write(str(filepath),
-               data=data,
-               header=header,
-               compression_level=compression_level)
+class _ParallelGzipWriter(io.RawIOBase):
+    """Writable file object that gzip-compresses NRRD data using threads.
+
+    Expects a raw-encoded NRRD to be written to it: the header is passed
+    through (with the encoding changed to gzip) while the data is split into
+    chunks which are deflated in parallel (zlib releases the GIL). The chunks
+    are joined into a single gzip member that any gzip reader understands.
+
+    Parameters
+    ----------
+    fh :                file object
+                        Binary file object to write to.
+    compression_level : int 1-9
+                        Compression level.
+    n_threads :         int
+                        Number of threads to use for compression.
+    chunksize :         int
+                        Size of each independently compressed chunk in bytes.
+
+    """
+
+    def __init__(self, fh, compression_level=3, n_threads=None,
+                 chunksize=2 ** 22):
+        self._fh = fh
+        self._level = compression_level
+        self._n_threads = n_threads or os.cpu_count()
+        self._chunksize = chunksize
+        self._header = b''
+        # Pieces of the next chunk - these are views into the written data
+        self._parts = []
+        self._n_buffered = 0
+        self._crc = 0
+        self._size = 0
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=self._n_threads)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = len(b)
+        if self._header is not None:
+            # The header is terminated by an empty line
+            self._header += bytes(b)
+            ix = self._header.find(b'\n\n')
+            if ix < 0:
+                return n
+            header, b = self._header[:ix + 2], self._header[ix + 2:]
+            self._header = None
+
+            self._fh.write(header.replace(b'encoding: raw\n',
+                                          b'encoding: gzip\n'))
+            # Gzip header: magic number, deflate, no flags/mtime, unknown OS
+            self._fh.write(b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff')
+
+        # We hold on to the data until it has been compressed, so we can only
+        # avoid copying immutable bytes
+        if not isinstance(b, bytes):
+            b = bytes(b)
+
+        # Split data into chunks without copying it
+        b = memoryview(b)
+        while len(b):
+            k = min(len(b), self._chunksize - self._n_buffered)
+            self._parts.append(b[:k])
+            self._n_buffered += k
+            b = b[k:]
+            if self._n_buffered == self._chunksize:
+                self._submit(self._parts)
+                self._parts, self._n_buffered = [], 0
+
+        return n
+
+    def _submit(self, parts, final=False):
+        """Compress chunk in a thread and write finished chunks in order."""
+        for p in parts:
+            self._crc = zlib.crc32(p, self._crc)
+            self._size += len(p)
+        self._pending.append(self._executor.submit(_deflate, parts,
+                                                   self._level, final))
+
+        # Limit the number of chunks we hold in memory
+        while len(self._pending) > 2 * self._n_threads or (final and self._pending):
+            self._fh.write(self._pending.popleft().result())
+
+    def close(self):
+        if not self.closed:
+            if self._header is not None:
+                raise ValueError('Incomplete NRRD header.')
+            self._submit(self._parts, final=True)
+            self._executor.shutdown()
+            # Gzip trailer: CRC32 and size of the uncompressed data
+            self._fh.write(struct.pack('<II', self._crc & 0xffffffff,
+                                       self._size & 0xffffffff))
+        super().close()
+
+
+def _deflate(parts, level, final=False):
+    """Compress chunk (given as list of buffers) into raw deflate stream.
+
+    Non-final chunks end in a sync flush so that the compressed chunks can
+    simply be concatenated.
+    """
+    c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    out = [c.compress(p) for p in parts]
+    out.append(c.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH))
+    return b''.join(out)
 
 
 def read_nrrd(f: Union[str, Iterable],
@@ -149,6 +413,7 @@ def read_nrrd(f: Union[str, Iterable],
               errors: Union[Literal['raise'],
                             Literal['log'],
                             Literal['ignore']] = 'log',
+              min_size: Optional[int] = None,
               **kwargs) -> 'core.NeuronObject':
     """Create Neuron/List from NRRD file.
 
@@ -159,11 +424,14 @@ def read_nrrd(f: Union[str, Iterable],
     ----------
     f :                 str | iterable
                         Filename(s) or folder. If folder, will import all
-                        ``.nrrd`` files.
+                        ``.nrrd`` files. Zstandard-compressed ``.nrrd.zst``
+                        files (see :func:`navis.write_nrrd`) are also
+                        supported if the ``zstandard`` library is installed.
     threshold :         int | float | None
                         For ``output='dotprops'`` only: a threshold to filter
                         low intensity voxels. If ``None``, no threshold is
-                        applied and all values > 0 are converted to points.
+                        applied and all non-zero values are converted to
+                        points.
     include_subdirs :   bool, optional
                         If True and ``f`` is a folder, will also search
                         subdirectories for ``.nrrd`` files.
@@ -179,6 +447,11 @@ def read_nrrd(f: Union[str, Iterable],
     errors :            "raise" | "log" | "ignore"
                         If "log" or "ignore", errors will not be raised but
                         instead empty neuron will be returned.
+    min_size :          int, optional
+                        For ``output='voxels'`` or ``output='dotprops'`` only:
+                        skip files with fewer than this many voxels (i.e. the
+                        product of the ``sizes`` header field). Skipped files
+                        are not read beyond their header.
 
     **kwargs
                         Keyword arguments passed to :func:`navis.make_dotprops`
@@ -205,51 +478,112 @@ def read_nrrd(f: Union[str, Iterable],
     utils.eval_param(output, name='output',
                      allowed_values=('raw', 'dotprops', 'voxels'))
 
+    # Raw output always returns all files
+    if output == 'raw':
+        min_size = None
+
     # If is directory, compile list of filenames
     if isinstance(f, str) and os.path.isdir(f):
+        # Note: scandir's entries cache the file type which saves us a stat()
+        # call per file
         if not include_subdirs:
-            f = [os.path.join(f, x) for x in os.listdir(f) if
-                 os.path.isfile(os.path.join(f, x)) and x.endswith('.nrrd')]
+            with os.scandir(f) as it:
+                f = [e.path for e in it if e.is_file() and e.name.endswith(NRRD_EXT)]
         else:
-            f = [y for x in os.walk(f) for y in glob(os.path.join(x[0], '*.nrrd'))]
+            f = [os.path.join(root, x) for root, _, files in os.walk(f)
+                 for x in files if x.endswith(NRRD_EXT)]
+
+        # Without zstandard we can't read compressed files - skip them rather
+        # than failing the entire import
+        if not zstandard:
+            n_files = len(f)
+            f = [x for x in f if not x.endswith('.zst')]
+            if len(f) < n_files:
+                logger.warning(f'Skipping {n_files - len(f)} .nrrd.zst file(s): '
+                               'reading them requires the zstandard library:\n'
+                               ' pip3 install zstandard')
 
     if utils.is_iterable(f):
+        # We need a list (not e.g. a set or generator) to index into it
+        f = list(f)
+
         # Do not use if there is only a small batch to import
         if isinstance(parallel, str) and parallel.lower() == 'auto':
             if len(f) < 10:
                 parallel = False
 
-        if parallel:
+        if parallel and f:
             # Do not swap this as ``isinstance(True, int)`` returns ``True``
             if isinstance(parallel, (bool, str)):
                 n_cores = os.cpu_count() - 2
             else:
                 n_cores = int(parallel)
 
-            with mp.Pool(processes=n_cores) as pool:
-                results = pool.imap(_worker_wrapper, [dict(f=x,
-                                                           threshold=threshold,
-                                                           output=output,
-                                                           errors=errors,
-                                                           include_subdirs=include_subdirs,
-                                                           parallel=False) for x in f],
-                                    chunksize=1)
-
-                res = list(config.tqdm(results,
-                                       desc='Importing',
-                                       total=len(f),
-                                       disable=config.pbar_hide,
-                                       leave=config.pbar_leave))
+            # Decompressing gzip/bzip2 payloads releases the GIL, so threads
+            # get us the parallelism without having to pickle the results.
+            # Dotprops still go to the process pool: generating them is slow
+            # and would otherwise run serially on the main thread while the
+            # decompressed volumes pile up in memory. To avoid an extra pass
+            # over all files, we only check a few evenly spaced ones
+            sample = f[::int(np.ceil(len(f) / _COMPRESSION_SAMPLE_SIZE))]
+            if output in ('raw', 'voxels') and any(map(_is_compressed, sample)):
+                with ThreadPoolExecutor(max_workers=n_cores) as executor:
+                    results = executor.map(partial(_read_file,
+                                                   min_size=min_size), f)
+
+                    # Neurons are constructed on the main thread as the
+                    # decompressed payloads come in
+                    res = []
+                    for fp, (data, header) in zip(f, config.tqdm(results,
+                                                                 desc='Importing',
+                                                                 total=len(f),
+                                                                 disable=config.pbar_hide,
+                                                                 leave=config.pbar_leave)):
+                        res.append(_nrrd_to_neuron(data, header, fp,
+                                                   threshold=threshold,
+                                                   output=output,
+                                                   errors=errors,
+                                                   **kwargs))
+            else:
+                # Pass only the filename positionally to keep the pickled payload
+                # small and let workers read files as they become available
+                worker = partial(_read_nrrd_single,
+                                 threshold=threshold,
+                                 output=output,
+                                 errors=errors,
+                                 min_size=min_size,
+                                 **kwargs)
+                chunksize = max(1, len(f) // (n_cores * 4))
+
+                # Forking avoids having to re-import navis in each worker
+                if sys.platform.startswith('linux'):
+                    ctx = mp.get_context('fork')
+                else:
+                    ctx = mp.get_context()
+
+                with ctx.Pool(processes=n_cores) as pool:
+                    # Raw output is returned as lists and hence needs to retain
+                    # the original order
+                    if output == 'raw':
+                        results = pool.imap(worker, f, chunksize=chunksize)
+                    else:
+                        results = pool.imap_unordered(worker, f,
+                                                      chunksize=chunksize)
+
+                    res = list(config.tqdm(results,
+                                           desc='Importing',
+                                           total=len(f),
+                                           disable=config.pbar_hide,
+                                           leave=config.pbar_leave))
 
         else:
             # If not parallel just import the good 'ole way: sequentially
-            res = [read_nrrd(x,
-                             threshold=threshold,
-                             include_subdirs=include_subdirs,
-                             output=output,
-                             errors=errors,
-                             parallel=parallel,
-                             **kwargs)
+            res = [_read_nrrd_single(x,
+                                     threshold=threshold,
+                                     output=output,
+                                     errors=errors,
+                                     min_size=min_size,
+                                     **kwargs)
                    for x in config.tqdm(f, desc='Importing',
                                         disable=config.pbar_hide,
                                         leave=config.pbar_leave)]
@@ -259,13 +593,251 @@ def read_nrrd(f: Union[str, Iterable],
 
         return core.NeuronList([r for r in res if r])
 
-    # Open the file
-    fname = os.path.basename(f).split('.')[0]
-    data, header = nrrd.read(f)
+    return _read_nrrd_single(f,
+                             threshold=threshold,
+                             output=output,
+                             errors=errors,
+                             min_size=min_size,
+                             **kwargs)
+
 
+def _read_nrrd_single(f, threshold=None, output='voxels', errors='log',
+                      min_size=None, **kwargs):
+    """Read single NRRD file.
+
+    This skips the parameter checks and dispatching of ``read_nrrd``, and is
+    also what worker processes run when importing in parallel.
+    """
+    # Memory-mapping is only safe if the data does not outlive this function
+    data, header = _read_file(f, min_size=min_size, mmap=output == 'dotprops')
+
+    return _nrrd_to_neuron(data, header, f,
+                           threshold=threshold,
+                           output=output,
+                           errors=errors,
+                           **kwargs)
+
+
+def _threshold_voxels(data, threshold=None, slab_size=2**20):
+    """Get indices of voxels above threshold as (N, 3) float32 array.
+
+    If no ``threshold`` is given, returns all non-zero voxels.
+
+    Processes the data in slabs of roughly ``slab_size`` voxels along the
+    slowest-varying axis to keep temporary arrays small and to only touch
+    each page of memory-mapped data once.
+    """
+    # Walk the data in memory order (pynrrd returns Fortran-ordered
+    # arrays) so that flattening does not require a copy
+    if data.flags.f_contiguous and not data.flags.c_contiguous:
+        order, axis = 'F', data.ndim - 1
+    else:
+        order, axis = 'C', 0
+
+    step = max(1, slab_size // max(1, data.size // max(1, data.shape[axis])))
+    chunks = []
+    for start in range(0, data.shape[axis], step):
+        slab = data[(slice(None), ) * axis + (slice(start, start + step), )]
+        flat = slab.ravel(order=order)
+        if threshold:
+            idx = np.flatnonzero(flat >= threshold)
+        else:
+            idx = np.flatnonzero(flat != 0)
+
+        if not idx.shape[0]:
+            continue
+
+        points = np.empty((idx.shape[0], data.ndim), dtype=np.float32)
+        for i, ix in enumerate(np.unravel_index(idx, slab.shape, order=order)):
+            points[:, i] = ix
+        points[:, axis] += start
+        chunks.append(points)
+
+    if not chunks:
+        return np.empty((0, data.ndim), dtype=np.float32)
+
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def _read_file(f, min_size=None, mmap=False):
+    """Read data and header from single NRRD file.
+
+    If the file has fewer than ``min_size`` voxels, its data is not read
+    and returned as ``None`` instead. If ``mmap=True``, uncompressed (raw)
+    data is memory-mapped rather than read into memory. The map keeps the
+    file open: callers must drop it before anything else might modify or
+    truncate the file, i.e. it must not end up in a neuron.
+    """
+    # Try the fast header parser first
+    header, offset = None, None
+    if not str(f).endswith('.zst'):
+        header, offset = _fast_nrrd_header(f)
+
+    if header is not None:
+        if min_size and np.prod(header['sizes']) < min_size:
+            return None, header
+
+        # Memory-map raw data: pages are only read from disk when accessed.
+        # Copy-on-write means the array can still be modified in memory.
+        dtype = _nrrd_dtype(header)
+        if mmap and header.get('encoding') == 'raw' and dtype is not None:
+            shape = tuple(header['sizes'])
+            if os.path.getsize(f) == offset + np.prod(shape) * dtype.itemsize:
+                data = np.memmap(f, dtype=dtype, mode='c', offset=offset,
+                                 shape=shape, order='F')
+                return data, header
+
+    with open(f, 'rb') as fh:
+        if str(f).endswith('.zst'):
+            if not zstandard:
+                raise ImportError('Reading .zst files requires the zstandard '
+                                  'library:\n pip3 install zstandard')
+            fh = io.BytesIO(zstandard.ZstdDecompressor().stream_reader(fh).read())
+
+        if header is None:
+            header = nrrd.read_header(fh)
+        else:
+            fh.seek(offset)
+
+        if min_size and np.prod(header['sizes']) < min_size:
+            return None, header
+
+        data = nrrd.read_data(header, fh, str(f))
+
+    return data, header
+
+
+def _nrrd_dtype(header):
+    """Get numpy dtype for NRRD header. Returns None if not supported."""
+    dtype = _NRRD_TYPES.get(header.get('type'))
+    if dtype is None:
+        return None
+    dtype = np.dtype(dtype)
+
+    if dtype.itemsize > 1:
+        endian = header.get('endian')
+        if endian not in ('little', 'big'):
+            return None
+        dtype = dtype.newbyteorder('<' if endian == 'little' else '>')
+
+    return dtype
+
+
+def _fast_nrrd_header(f):
+    """Parse NRRD header without going through pynrrd's generic parser.
+
+    Only supports headers made up of the standard fields navis typically
+    encounters (see ``_FAST_HEADER_FIELDS``) and returns the same types as
+    ``nrrd.read_header``. For anything else - e.g. custom key/value pairs,
+    byte skips or detached data - returns ``(None, None)`` so that the caller
+    can fall back to pynrrd.
+
+    Returns
+    -------
+    header :    OrderedDict | None
+    offset :    int | None
+                Byte offset of the data in the file.
+
+    """
+    with open(f, 'rb') as fh:
+        buffer = fh.read(4096)
+        if not buffer.startswith(b'NRRD000'):
+            return None, None
+
+        # The header is terminated by an empty line. Only search the newly
+        # read bytes (plus enough overlap to catch a split line ending)
+        start = 0
+        while True:
+            end = _HEADER_END.search(buffer, max(0, start - 3))
+            if end:
+                break
+            if len(buffer) >= _FAST_HEADER_MAX_BYTES:
+                return None, None
+            chunk = fh.read(4096)
+            if not chunk:
+                return None, None
+            start = len(buffer)
+            buffer += chunk
+
+    offset = end.end()
+    try:
+        lines = buffer[:end.start()].decode('ascii').splitlines()
+    except UnicodeDecodeError:
+        return None, None
+
+    header = OrderedDict()
+    for line in lines[1:]:
+        line = line.rstrip()
+        if line.startswith('#'):
+            continue
+
+        field, sep, value = line.partition(': ')
+        if not sep or field not in _FAST_HEADER_FIELDS or field in header:
+            return None, None
+        value = value.strip()
+
+        try:
+            if field in ('dimension', 'space dimension'):
+                value = int(value)
+            elif field == 'sizes':
+                value = np.array([int(v) for v in value.split()])
+            elif field == 'kinds':
+                value = value.split()
+            elif field == 'space units':
+                value = re.findall(r'"([^"]*)"', value)
+            elif field == 'space origin':
+                value = _parse_vector(value)
+            elif field == 'space directions':
+                rows = [None if v == 'none' else _parse_vector(v)
+                        for v in value.split()]
+                n = max(len(r) for r in rows if r is not None)
+                value = np.vstack([np.full(n, np.nan) if r is None else r
+                                   for r in rows])
+        except ValueError:
+            return None, None
+
+        header[field] = value
+
+    return header, offset
+
+
+def _parse_vector(x):
+    """Parse NRRD vector such as "(1,0,0)" into array of floats."""
+    if not (x.startswith('(') and x.endswith(')')):
+        raise ValueError(f'Invalid vector: {x}')
+    return np.array([float(v) for v in x[1:-1].split(',')])
+
+
+def _is_compressed(f):
+    """Check if NRRD file uses a compressed encoding.
+
+    Returns ``False`` if the header can't be read - the error will surface
+    (and be handled) when the file is actually read.
+    """
+    if str(f).endswith('.zst'):
+        return True
+    try:
+        header, _ = _fast_nrrd_header(f)
+        if header is None:
+            header = nrrd.read_header(str(f))
+    except Exception:
+        return False
+    return header.get('encoding', 'raw') in ('gzip', 'gz', 'bzip2', 'bz2')
+
+
+def _nrrd_to_neuron(data, header, f, threshold=None, output='voxels',
+                    errors='log', **kwargs):
+    """Convert data + header from NRRD file into neuron."""
     if output == 'raw':
         return data, header
 
+    fname = os.path.basename(f).split('.')[0]
+
+    # Data is None if the file was skipped for being too small
+    if data is None:
+        logger.debug(f'Skipped file {fname}: fewer voxels than `min_size`')
+        return
+
     # Try parsing units - this is modelled after the nrrd files you get from
     # Virtual Fly Brain (VFB)
     units = None
@@ -284,14 +856,10 @@ def read_nrrd(f: Union[str, Iterable],
 
     try:
         if output == 'dotprops':
-            if threshold:
-                data = data >= threshold
-
             # Data is in voxels - we have to convert it to x/y/z coordinates
             # We need to multiply units first otherwise the KNN will be wrong
-            x, y, z = np.where(data)
-            points = np.vstack((x, y, z)).T
-            points = points * voxdim
+            points = _threshold_voxels(data, threshold)
+            np.multiply(points, voxdim.astype(np.float32), out=points)
 
             x = core.make_dotprops(points, **kwargs)
 
@@ -313,8 +881,3 @@ def read_nrrd(f: Union[str, Iterable],
     x.nrrd_header = header
 
     return x
-
-
-def _worker_wrapper(kwargs):
-    """Helper for importing NRRDs using multiple processes."""
-    return read_nrrd(**kwargs)
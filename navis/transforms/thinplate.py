@@ -13,14 +13,26 @@
 
 """Functions to perform thin plate spline transforms. Requires morphops."""
 
+import hashlib
+import threading
+
 import morphops as mops
 import numpy as np
 import pandas as pd
 
+from collections import OrderedDict
+from typing import Optional
+
+from scipy.linalg import get_lapack_funcs, lu_solve
 from scipy.spatial.distance import cdist
 
 from .base import BaseTransform
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 def distance_matrix(X,Y):
     """For (p1,k)-shaped X and (p2,k)-shaped Y, returns the (p1,p2) matrix
@@ -34,6 +46,117 @@ def distance_matrix(X,Y):
 # Replace morphops's original slow distance_matrix function
 mops.lmk_util.distance_matrix = distance_matrix
 
+# LU factorizations of the TPS linear system, keyed by source landmarks
+_LU_CACHE = OrderedDict()
+_LU_CACHE_LOCK = threading.Lock()
+_LU_CACHE_MAX_BYTES = 64 * 2 ** 20
+
+# Number of radial basis elements (points x landmarks) TPStransform.xform
+# computes at a time - this keeps each tile's basis in L2 cache
+_XFORM_TILE = 2 ** 17
+
+# Below this number of landmarks, TPStransform.xform uses a fused kernel
+_FUSED_MAX_LANDMARKS = 16
+
+
+def _factorize_L(source):
+    """LU-factorize the L matrix [[K, P], [P.T, 0]] for given landmarks.
+
+    Factorizations are cached (up to ``_LU_CACHE_MAX_BYTES``) so that
+    transforms sharing the same source landmarks only have to run the
+    O(M^3) decomposition once.
+
+    Raises ``np.linalg.LinAlgError`` if the matrix is singular (e.g. because
+    of duplicate landmarks).
+    """
+    source = np.ascontiguousarray(source, dtype=np.float64)
+    key = hashlib.blake2b(source.tobytes(), digest_size=16).digest()
+
+    with _LU_CACHE_LOCK:
+        if key in _LU_CACHE:
+            _LU_CACHE.move_to_end(key)
+            return _LU_CACHE[key]
+
+    M = source.shape[0]
+    L = np.zeros((M + 4, M + 4))
+    L[:M, :M] = cdist(source, source)
+    L[:M, M] = 1
+    L[:M, M + 1:] = source
+    L[M:, :M] = L[:M, M:].T
+
+    # Use LAPACK directly instead of scipy.linalg.lu_factor: the latter only
+    # warns about singular matrices but we want to raise like np.linalg.solve
+    getrf, = get_lapack_funcs(('getrf', ), (L, ))
+    lu, piv, info = getrf(L, overwrite_a=True)
+    if info > 0:
+        raise np.linalg.LinAlgError('Singular matrix: unable to calculate thin '
+                                    'plate spline coefficients. Please check '
+                                    'for duplicate landmarks.')
+    lu = (lu, piv)
+
+    if lu[0].nbytes <= _LU_CACHE_MAX_BYTES:
+        with _LU_CACHE_LOCK:
+            _LU_CACHE[key] = lu
+            # Drop the least recently used factorizations
+            while sum(v[0].nbytes for v in _LU_CACHE.values()) > _LU_CACHE_MAX_BYTES:
+                _LU_CACHE.popitem(last=False)
+
+    return lu
+
+
+# Note: the kernels below deliberately don't use parallel=True - navis
+# parallelizes across neurons using forked processes and forking after numba
+# has started its (e.g. TBB) thread pool can leave processes hanging
+if njit:
+    @njit(fastmath=True, cache=True)
+    def _tps_K_3d(P, src_x, src_y, src_z, out):
+        """Write distances between (N, 3) points P and landmarks into (N, M)
+        array ``out``.
+
+        This is the radial basis for 3D thin plate splines. Landmark
+        coordinates are expected as separate (M, ) arrays so that the inner
+        loop runs over contiguous memory and can be vectorized.
+        """
+        for i in range(P.shape[0]):
+            x = P[i, 0]
+            y = P[i, 1]
+            z = P[i, 2]
+            for j in range(src_x.shape[0]):
+                dx = x - src_x[j]
+                dy = y - src_y[j]
+                dz = z - src_z[j]
+                out[i, j] = np.sqrt(dx * dx + dy * dy + dz * dz)
+
+    @njit(fastmath=True, cache=True)
+    def _tps_xform_3d(P, src, WA, out):
+        """Write thin plate spline transform of (N, 3) points P into ``out``.
+
+        ``WA`` is the stacked (M + 4, 3) coefficient matrix [W; A]. Unlike
+        ``_tps_K_3d`` this never materializes the (N, M) radial basis,
+        which is faster for small numbers of landmarks.
+        """
+        M = src.shape[0]
+        for i in range(P.shape[0]):
+            x = P[i, 0]
+            y = P[i, 1]
+            z = P[i, 2]
+            # Affine part
+            a0 = WA[M, 0] + x * WA[M + 1, 0] + y * WA[M + 2, 0] + z * WA[M + 3, 0]
+            a1 = WA[M, 1] + x * WA[M + 1, 1] + y * WA[M + 2, 1] + z * WA[M + 3, 1]
+            a2 = WA[M, 2] + x * WA[M + 1, 2] + y * WA[M + 2, 2] + z * WA[M + 3, 2]
+            # Non-uniform part
+            for j in range(M):
+                dx = x - src[j, 0]
+                dy = y - src[j, 1]
+                dz = z - src[j, 2]
+                r = np.sqrt(dx * dx + dy * dy + dz * dz)
+                a0 += r * WA[j, 0]
+                a1 += r * WA[j, 1]
+                a2 += r * WA[j, 2]
+            out[i, 0] = a0
+            out[i, 1] = a1
+            out[i, 2] = a2
+
 
 class TPStransform(BaseTransform):
     """Thin Plate Spline transforms of 3D spatial data.
@@ -44,6 +167,14 @@ class TPStransform(BaseTransform):
                         Source landmarks as x/y/z coordinates.
     landmarks_target :  (M, 3) numpy array
                         Target landmarks as x/y/z coordinates.
+    dtype :             numpy dtype, optional
+                        Floating point precision used to transform points.
+                        Coefficients are always calculated at float64
+                        precision. If ``None`` (default), will use float32
+                        if both source and target landmarks are float32 and
+                        float64 otherwise. float32 halves the memory required
+                        for transforming large numbers of points and is
+                        typically sufficient (sub-voxel) for registrations.
 
     Examples
     --------
@@ -61,12 +192,20 @@ class TPStransform(BaseTransform):
     """
 
     def __init__(self, landmarks_source: np.ndarray,
-                 landmarks_target: np.ndarray):
+                 landmarks_target: np.ndarray,
+                 dtype: Optional[type] = None):
         """Initialize class."""
         # Some checks
         self.source = np.asarray(landmarks_source)
         self.target = np.asarray(landmarks_target)
 
+        if dtype is None:
+            dtype = np.result_type(self.source, self.target, np.float32)
+        self.dtype = np.dtype(dtype)
+
+        if self.dtype.kind != 'f':
+            raise ValueError(f'Expected floating point dtype, got "{self.dtype}"')
+
         if self.source.shape[1] != 3:
             raise ValueError(f'Expected (N, 3) array, got {self.source.shape}')
         if self.target.shape[1] != 3:
@@ -76,6 +215,9 @@ class TPStransform(BaseTransform):
             raise ValueError('Number of source landmarks must match number of '
                              'target landmarks.')
 
+        # Per-thread scratch space for xform
+        self._scratch = threading.local()
+
         # Calculate coefficients
         self._calc_tps_coefs()
 
@@ -88,23 +230,70 @@ class TPStransform(BaseTransform):
                         return True
         return False
 
+    def __getstate__(self):
+        """Get state (used e.g. for pickling)."""
+        state = self.__dict__.copy()
+
+        # Thread-local scratch buffers can't (and needn't) be pickled
+        _ = state.pop('_scratch', None)
+
+        return state
+
+    def __setstate__(self, d):
+        """Update state (used e.g. for pickling)."""
+        self.__dict__.update(d)
+        self._scratch = threading.local()
+
     def __neg__(self) -> 'TPStransform':
         """Invert direction."""
         # Switch source and target
-        return TPStransform(self.target, self.source)
+        return TPStransform(self.target, self.source, dtype=self.dtype)
 
     def _calc_tps_coefs(self):
-        # Calculate thinplate coefficients
-        self.W, self.A = mops.tps_coefs(self.source, self.target)
+        # Calculate thinplate coefficients by solving L @ [W; A] = [Y; 0] -
+        # this requires float64 precision
+        M = self.source.shape[0]
+        Y = np.zeros((M + 4, 3))
+        Y[:M] = self.target
+        coefs = lu_solve(_factorize_L(self.source), Y, check_finite=False)
+        if not np.all(np.isfinite(coefs)):
+            raise np.linalg.LinAlgError('Unable to calculate thin plate spline '
+                                        'coefficients: result contains '
+                                        'non-finite values.')
+        self.W = coefs[:M].astype(self.dtype)
+        self.A = coefs[M:].astype(self.dtype)
+        self._WA = np.ascontiguousarray(coefs, dtype=self.dtype)
+
+        # Keep a C-contiguous copy of the source landmarks so that they don't
+        # have to be converted again on every call to xform
+        self._src = np.ascontiguousarray(self.source, dtype=self.dtype)
+
+        # Same landmarks but as separate x/y/z arrays (structure of arrays)
+        self._src_x = np.ascontiguousarray(self._src[:, 0])
+        self._src_y = np.ascontiguousarray(self._src[:, 1])
+        self._src_z = np.ascontiguousarray(self._src[:, 2])
 
     def copy(self):
         """Make copy."""
-        x = TPStransform(self.source, self.target)
+        x = TPStransform(self.source, self.target, dtype=self.dtype)
 
-        x.__dict__.update(self.__dict__)
+        x.__dict__.update(self.__getstate__())
 
         return x
 
+    def _get_scratch(self, n: int, dtype) -> np.ndarray:
+        """Get (n, M) scratch array for the radial basis.
+
+        The underlying buffer is kept per thread and re-used across calls
+        unless it needs to grow. ``xform`` asks for at most one tile's
+        worth of rows, which bounds it to roughly ``_XFORM_TILE`` elements.
+        """
+        buf = getattr(self._scratch, 'U', None)
+        if buf is None or buf.shape[0] < n or buf.dtype != dtype:
+            buf = self._scratch.U = np.empty((n, self._src.shape[0]),
+                                             dtype=dtype)
+        return buf[:n]
+
     def xform(self, points: np.ndarray) -> np.ndarray:
         """Transform points.
 
@@ -119,12 +308,44 @@ class TPStransform(BaseTransform):
                     Transformed points.
 
         """
-        if isinstance(points, pd.DataFrame):
-            if any([c not in points for c in ['x', 'y', 'z']]):
-                raise ValueError('DataFrame must have x/y/z columns.')
-            points = points[['x', 'y', 'z']].values
-
-        U = mops.K_matrix(points, self.source)
-        P = mops.P_matrix(points)
-        # The warped pts are the affine part + the non-uniform part
-        return np.matmul(P, self.A) + np.matmul(U, self.W)
+        # Check the common case (plain numpy array) first
+        if points.__class__ is not np.ndarray:
+            if isinstance(points, pd.DataFrame):
+                if any([c not in points for c in ['x', 'y', 'z']]):
+                    raise ValueError('DataFrame must have x/y/z columns.')
+                # Select columns and cast in one go
+                points = points[['x', 'y', 'z']].to_numpy(dtype=self.dtype)
+
+        # Our kernels and the tiling assume C-contiguous points - convert once
+        points = np.ascontiguousarray(points, dtype=self.dtype)
+
+        # For few landmarks it's faster to not build the radial basis at all
+        if njit and self._src.shape[0] < _FUSED_MAX_LANDMARKS:
+            xf = np.empty((points.shape[0], 3), dtype=self.dtype)
+            _tps_xform_3d(points, self._src, self._WA, xf)
+            return xf
+
+        # The warped pts are the non-uniform part U @ W + the affine part.
+        # The latter is P @ A with P = [1, x, y, z] which we evaluate in place
+        # instead of building P. We process points in tiles so that each
+        # tile's (TILE, M) radial basis stays cache-resident
+        tile = max(1, _XFORM_TILE // self._src.shape[0])
+        xf = np.empty((points.shape[0], 3), dtype=self.dtype)
+        for i in range(0, points.shape[0], tile):
+            pts = points[i:i + tile]
+            out = xf[i:i + tile]
+
+            # In 3D, the radial basis is simply the distance to the landmarks
+            if njit:
+                U = self._get_scratch(pts.shape[0], self.dtype)
+                _tps_K_3d(pts, self._src_x, self._src_y, self._src_z, U)
+            else:
+                # Note: cdist can only write to float64 arrays
+                U = self._get_scratch(pts.shape[0], np.float64)
+                cdist(pts, self._src, out=U)
+
+            np.matmul(U, self.W, out=out)
+            out += np.matmul(pts, self.A[1:])
+        xf += self.A[0]
+
+        return xf
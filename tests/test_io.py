@@ -2,6 +2,7 @@ import navis
 import pytest
 import tempfile
 import numpy as np
+import nrrd
 
 from pathlib import Path
 
@@ -87,3 +88,188 @@ def test_roundtrip_nrrd(voxel_nrrd_path):
     assert np.allclose(vneuron._data, vneuron2._data)
     assert np.allclose(vneuron.units_xyz.magnitude, vneuron2.units_xyz.magnitude)
     assert vneuron.units_xyz.units == vneuron2.units_xyz.units
+
+
+def test_read_nrrd_dotprops(voxel_nrrd_path):
+    dp = navis.read_nrrd(voxel_nrrd_path, output="dotprops", errors="raise", k=5)
+    data, _ = navis.read_nrrd(voxel_nrrd_path, output="raw")
+    assert isinstance(dp, navis.Dotprops)
+    assert dp.n_points == (data != 0).sum()
+    # Points must be scaled by the voxel dimensions
+    assert np.allclose(dp.points.max(axis=0), [9 * 1, 9 * 2, 14 * 3])
+
+
+def test_read_nrrd_dotprops_signed(voxel_nrrd_path):
+    # Without a threshold, negative voxels must be kept too
+    data = np.zeros((10, 10, 10), dtype=np.int16)
+    data[2:5, 2:5, 2:5] = 5
+    data[6:9, 6:9, 6:9] = -5
+    nrrd.write(str(voxel_nrrd_path), data)
+    dp = navis.read_nrrd(voxel_nrrd_path, output="dotprops", errors="raise", k=5)
+    assert dp.n_points == 2 * 3 ** 3
+    dp = navis.read_nrrd(voxel_nrrd_path, output="dotprops", errors="raise",
+                         threshold=1, k=5)
+    assert dp.n_points == 3 ** 3
+
+
+@pytest.mark.parametrize("order", ['C', 'F'])
+@pytest.mark.parametrize("threshold", [None, 0.5])
+@pytest.mark.parametrize("slab_size", [1, 150, 2 ** 20])
+def test_threshold_voxels(order, threshold, slab_size):
+    from navis.io.nrrd_io import _threshold_voxels
+
+    rng = np.random.RandomState(1991)
+    data = rng.random((7, 8, 9)) - 0.25
+    data[data < 0.2] = 0
+    data = np.asarray(data, order=order)
+
+    points = _threshold_voxels(data, threshold=threshold, slab_size=slab_size)
+    expected = np.argwhere(data >= threshold if threshold else data != 0)
+
+    assert points.dtype == np.float32
+    # Points come in memory order - sort before comparing
+    assert np.array_equal(np.unique(points, axis=0), expected)
+    assert len(points) == len(expected)
+
+
+@pytest.mark.parametrize("padding", [0, 4090, 8000])
+@pytest.mark.parametrize("newline", [b'\n', b'\r\n'])
+def test_fast_nrrd_header(voxel_nrrd_path, newline, padding):
+    from navis.io.nrrd_io import _fast_nrrd_header
+
+    data, header = navis.read_nrrd(voxel_nrrd_path, output="raw")
+    nrrd.write(str(voxel_nrrd_path), data, dict(header, encoding='raw'))
+
+    # Rewrite header with given line endings and pad it with comments so
+    # that its end falls into (or straddles) later read blocks
+    content = voxel_nrrd_path.read_bytes()
+    head, payload = content.split(b'\n\n', 1)
+    lines = head.split(b'\n')
+    lines.insert(1, b'# ' + b'x' * padding)
+    voxel_nrrd_path.write_bytes(newline.join(lines) + newline * 2 + payload)
+
+    fast, offset = _fast_nrrd_header(voxel_nrrd_path)
+    assert fast is not None
+    assert offset == voxel_nrrd_path.stat().st_size - len(payload)
+    assert np.array_equal(fast['sizes'], nrrd.read_header(str(voxel_nrrd_path))['sizes'])
+
+    data2, _ = navis.read_nrrd(voxel_nrrd_path, output="raw")
+    assert np.array_equal(data, data2)
+
+
+def test_fast_nrrd_header_invalid(tmp_path):
+    from navis.io.nrrd_io import _fast_nrrd_header
+
+    # Not an NRRD file: must bail out right away
+    path = tmp_path / "not_a.nrrd"
+    path.write_bytes(b'\x00' * 2 ** 20)
+    assert _fast_nrrd_header(path) == (None, None)
+
+
+def test_read_nrrd_min_size(voxel_nrrd_path):
+    # Test file has 15 x 15 x 15 voxels
+    assert navis.read_nrrd(voxel_nrrd_path, min_size=15 ** 3 + 1) is None
+    assert isinstance(navis.read_nrrd(voxel_nrrd_path, min_size=15 ** 3),
+                      navis.VoxelNeuron)
+
+
+@pytest.mark.parametrize("compression", ['gzip', 'raw', 'zstd'])
+def test_roundtrip_nrrd_compression(voxel_nrrd_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    vneuron = navis.read_nrrd(voxel_nrrd_path, output="voxels", errors="raise")
+    outpath = voxel_nrrd_path.parent / "written.nrrd"
+    navis.write_nrrd(vneuron, outpath, compression=compression)
+    if compression == 'zstd':
+        # ".zst" gets appended to the filename
+        assert not outpath.exists()
+        outpath = outpath.with_suffix('.nrrd.zst')
+    vneuron2 = navis.read_nrrd(outpath, output="voxels", errors="raise")
+    assert vneuron2.nrrd_header['encoding'] == ('gzip' if compression == 'gzip' else 'raw')
+    assert np.allclose(vneuron._data, vneuron2._data)
+
+
+def test_read_nrrd_folder_without_zstd(voxel_nrrd_path, monkeypatch):
+    # .nrrd.zst files must not break folder imports if zstandard is missing
+    (voxel_nrrd_path.parent / "compressed.nrrd.zst").write_bytes(b'')
+    monkeypatch.setattr(navis.io.nrrd_io, 'zstandard', None)
+    nl = navis.read_nrrd(str(voxel_nrrd_path.parent), errors="log")
+    assert len(nl) == 1
+
+
+@pytest.mark.parametrize("piece_size", [None, 1, 777])
+def test_parallel_gzip_writer(voxel_nrrd_path, piece_size):
+    import io
+    from navis.io.nrrd_io import _ParallelGzipWriter
+
+    data, header = navis.read_nrrd(voxel_nrrd_path, output="raw")
+    raw = io.BytesIO()
+    nrrd.write(raw, data, dict(header, encoding='raw'))
+    raw = raw.getvalue()
+
+    # Use a small chunksize to force multiple sync-flushed chunks
+    outpath = voxel_nrrd_path.parent / "written.nrrd"
+    with open(outpath, 'wb') as fh:
+        with _ParallelGzipWriter(fh, n_threads=2, chunksize=1000) as pfh:
+            if piece_size:
+                for i in range(0, len(raw), piece_size):
+                    pfh.write(bytearray(raw[i:i + piece_size]))
+            else:
+                nrrd.write(pfh, data, dict(header, encoding='raw'))
+
+    data2, header2 = nrrd.read(str(outpath))
+    assert header2['encoding'] == 'gzip'
+    assert np.array_equal(data, data2)
+
+
+def test_roundtrip_nrrd_parallel_compress(voxel_nrrd_path):
+    vneuron = navis.read_nrrd(voxel_nrrd_path, output="voxels", errors="raise")
+    outpath = voxel_nrrd_path.parent / "written.nrrd"
+    navis.write_nrrd(vneuron, outpath, parallel_compress=2)
+    vneuron2 = navis.read_nrrd(outpath, output="voxels", errors="raise")
+    assert vneuron2.nrrd_header['encoding'] == 'gzip'
+    assert np.allclose(vneuron._data, vneuron2._data)
+
+
+def test_roundtrip_nrrd_raw_inplace(voxel_nrrd_path):
+    # Overwriting the file a raw NRRD neuron was read from must not corrupt it
+    vneuron = navis.read_nrrd(voxel_nrrd_path, output="voxels", errors="raise")
+    navis.write_nrrd(vneuron, voxel_nrrd_path, compression='raw')
+    vneuron2 = navis.read_nrrd(voxel_nrrd_path, output="voxels", errors="raise")
+    navis.write_nrrd(vneuron2, voxel_nrrd_path, compression='raw')
+    vneuron3 = navis.read_nrrd(voxel_nrrd_path, output="voxels", errors="raise")
+    assert vneuron3.nrrd_header['encoding'] == 'raw'
+    assert np.allclose(vneuron._data, vneuron3._data)
+    # Dotprops are generated from memory-mapped raw data
+    dp = navis.read_nrrd(voxel_nrrd_path, output="dotprops", errors="raise", k=5)
+    assert dp.n_points == (vneuron._data != 0).sum()
+
+
+@pytest.mark.parametrize("output", ['voxels', 'dotprops', 'raw'])
+@pytest.mark.parametrize("encoding", ['gzip', 'raw'])
+def test_read_nrrd_parallel(voxel_nrrd_path, output, encoding):
+    data, header = navis.read_nrrd(voxel_nrrd_path, output="raw")
+    for i in range(4):
+        nrrd.write(str(voxel_nrrd_path.parent / f"{i}.nrrd"), data * (i + 1),
+                   dict(header, encoding=encoding))
+    files = {voxel_nrrd_path.parent / f"{i}.nrrd" for i in range(4)}
+
+    seq = navis.read_nrrd(str(voxel_nrrd_path.parent), output=output, k=5,
+                          errors="raise")
+    par = navis.read_nrrd(str(voxel_nrrd_path.parent), output=output, k=5,
+                          errors="raise", parallel=2)
+    # Non-sequence iterables should work too
+    par_set = navis.read_nrrd(files, output=output, k=5, errors="raise",
+                              parallel=2)
+
+    if output == 'raw':
+        assert len(seq[0]) == len(par[0]) == 5 and len(par_set[0]) == 4
+        assert sum(d.sum() for d in seq[0]) == sum(d.sum() for d in par[0])
+    else:
+        assert len(seq) == len(par) == 5 and len(par_set) == 4
+        assert sorted(n.name for n in seq) == sorted(n.name for n in par)
+
+
+def test_read_nrrd_parallel_empty(tmp_path):
+    assert len(navis.read_nrrd(str(tmp_path), parallel=2)) == 0
+    assert navis.read_nrrd([], output='raw', parallel=2) == ([], [])
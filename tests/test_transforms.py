@@ -1,5 +1,9 @@
 import navis
 import flybrains
+import pytest
+
+import morphops as mops
+import numpy as np
 
 # Add fake bounds for JRCFIB
 flybrains.JRCFIB2018Fraw.boundingbox = [0, 34499, 7409, 37539, 2952, 40076]
@@ -91,3 +95,56 @@ def test_volume_mirror():
 
     assert isinstance(vol, navis.Volume)
     assert vol.vertices.shape[0] == tr.vertices.shape[0]
+
+
+# M < 16 uses the fused numba kernel (if available)
+@pytest.mark.parametrize("M", [4, 15, 16, 50])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_tps_transform(dtype, M):
+    rng = np.random.default_rng(1991)
+    src = rng.random((M, 3)) * 100
+    trg = src + rng.random((M, 3)) * 10
+    points = rng.random((1000, 3)) * 100
+
+    tr = navis.transforms.TPStransform(src, trg, dtype=dtype)
+    xf = tr.xform(points)
+
+    assert xf.dtype == dtype
+    assert np.allclose(xf, mops.tps_warp(src, trg, points),
+                       atol=1e-2 if dtype == np.float32 else 1e-8)
+    # Landmarks must map onto each other
+    assert np.allclose(tr.xform(src), trg, atol=1e-2)
+    assert np.allclose((-tr).xform(trg), src, atol=1e-2)
+
+
+def test_tps_transform_singular():
+    # Duplicate landmarks make the system singular
+    src = np.array([[0, 0, 0], [10, 10, 10], [10, 10, 10], [80, 10, 30],
+                    [5, 60, 2]])
+    with pytest.raises(np.linalg.LinAlgError):
+        navis.transforms.TPStransform(src, src + 1)
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_tps_transform_tiles(dtype, use_numba, monkeypatch):
+    from navis.transforms import thinplate
+    if not use_numba:
+        # Use the cdist fallback
+        monkeypatch.setattr(thinplate, 'njit', None)
+
+    rng = np.random.default_rng(1991)
+    src = rng.random((50, 3)) * 100
+    trg = src + rng.random((50, 3)) * 10
+    # Multiple full tiles plus a short last one
+    tile = thinplate._XFORM_TILE // 50
+    points = rng.random((2 * tile + 123, 3)) * 100
+
+    tr = navis.transforms.TPStransform(src, trg, dtype=dtype)
+    xf = tr.xform(points)
+
+    assert xf.dtype == dtype
+    assert np.allclose(xf, mops.tps_warp(src, trg, points),
+                       atol=1e-2 if dtype == np.float32 else 1e-8)
+    # Re-using the (now larger) scratch buffer for fewer points
+    assert np.allclose(tr.xform(points[:10]), xf[:10])